@@ -2,52 +2,233 @@
 
 import os
 import sys
+import mmap
+import fcntl
 import tarfile
 import tempfile
 import subprocess
+import contextlib
 from pathlib import Path
-import re # For more robust parsing if needed, though split is likely sufficient
+import re
+import errno
+import json
+
+try:
+    import liburing # Optional: batches the post-archive unlinks through io_uring (Linux only)
+except ImportError:
+    liburing = None
+# Only use bindings with the API used below (older ones use the C-style io_uring_prep_unlinkat)
+_LIBURING_API = ('Ring', 'Cqe', 'io_uring_op', 'io_uring_queue_init', 'io_uring_queue_exit',
+                 'io_uring_get_probe_ring', 'io_uring_opcode_supported', 'io_uring_free_probe',
+                 'io_uring_get_sqe', 'io_uring_prep_unlink', 'io_uring_sqe_set_data64',
+                 'io_uring_submit_and_wait', 'io_uring_wait_cqe', 'io_uring_cqe_seen')
+if liburing is not None and not all(hasattr(liburing, name) for name in _LIBURING_API):
+    liburing = None
 
 # --- Configuration ---
 OUTPUT_DIR = Path("out")
 COMPLETED_FILE = Path("completed_ids.txt")
 # Use Path object for the archive path
 ARCHIVE_PATH = OUTPUT_DIR / "archive_ranges.tar"
-TITLE_PATTERN = "*.title" # Pattern for title files within OUTPUT_DIR
+TITLE_SUFFIX = ".title" # Suffix of title files within OUTPUT_DIR
+INDEX_PATH = OUTPUT_DIR / ".archive_index.json" # Cached filename metadata from previous runs
 K_STEP = 2 # Step used in generation script
+_UNI_RE = re.compile(r'^uni_(\d+)_(\d+)_(\d+)\.txt$') # Format: uni_N_KMIN_KMAX.txt
+TAR_COPY_BUFSIZE = 2 * 1024 * 1024 # Chunk size tarfile uses to copy member data (default is 16 KiB)
+ARCHIVE_WRITE_BUFSIZE = 8 * 1024 * 1024 # Buffer size for the archive file itself
+TAR_STREAM_BUFSIZE = 1024 * 1024 # Block size tarfile writes in when streaming a new archive
+IO_URING_ENTRIES = 256 # Submission queue size for batched unlinks
+_FLOCK_UNSUPPORTED = (errno.ENOSYS, errno.ENOLCK, errno.EOPNOTSUPP) # flock not available on this filesystem
 
 # --- Helper Functions ---
 
-def load_completed_ids(filepath: Path) -> set:
-    """Loads completed IDs from the tracking file into a set for fast lookups."""
+def lock_tracking_file(f, operation, filepath: Path):
+    """
+    flock()s an open tracking file. On filesystems without flock support (e.g. Lustre
+    mounted with noflock) this warns and carries on unlocked rather than failing.
+    """
+    try:
+        fcntl.flock(f, operation)
+    except OSError as e:
+        if e.errno not in _FLOCK_UNSUPPORTED:
+            raise
+        print(f"Warning: Cannot lock tracking file {filepath} ({e.strerror}). Continuing without a lock.", file=sys.stderr)
+
+def load_completed_ids(filepath: Path) -> dict[int, set[int]]:
+    """
+    Loads completed IDs ("n_k" lines) from the tracking file, indexed by n: {n: {k, ...}}.
+    The file is mapped and split in C; lookups then only hash the integer k.
+    """
     if not filepath.exists():
         print(f"Warning: Completed IDs file '{filepath}' not found. Assuming no IDs are completed.", file=sys.stderr)
-        return set()
+        return {}
     try:
-        with open(filepath, 'r') as f:
-            return set(line.strip() for line in f if line.strip())
+        with open(filepath, 'rb') as f:
+            # Shared lock: writers take LOCK_EX, so we never map a half-appended batch
+            lock_tracking_file(f, fcntl.LOCK_SH, filepath)
+            if os.fstat(f.fileno()).st_size == 0: # mmap cannot map an empty file
+                return {}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                id_lines = mm[:].split() # split() drops blank lines and stray whitespace
+        completed_by_n = {}
+        for id_bytes in id_lines:
+            n_bytes, _, k_bytes = id_bytes.partition(b'_')
+            try:
+                n, k = int(n_bytes), int(k_bytes)
+            except ValueError:
+                continue # Ignore malformed lines
+            completed_by_n.setdefault(n, set()).add(k)
+        return completed_by_n
     except IOError as e:
         print(f"Error reading completed IDs file {filepath}: {e}", file=sys.stderr)
         sys.exit(1) # Exit if we can't read the crucial completion file
 
-def check_range_completion(n: int, kmin: int, kmax: int, completed_set: set) -> tuple[bool, list[str]]:
+def check_range_completion(n: int, kmin: int, kmax: int, completed_by_n: dict[int, set[int]]) -> tuple[bool, list[str]]:
     """
     Checks if all odd k values in the range [kmin, kmax) for a given n
-    are present in the completed_set.
+    are present in completed_by_n (see load_completed_ids).
 
     Returns:
         tuple: (bool: True if all complete, list[str]: list of missing IDs)
     """
-    missing_ids = []
     if kmin >= kmax: # Handle empty or invalid range
         return False, [] # Consider an empty range not complete for archiving
 
-    for k in range(kmin, kmax, K_STEP):
-        individual_id = f"{n}_{k}"
-        if individual_id not in completed_set:
-            missing_ids.append(individual_id)
+    # Let a C-level set difference over the integer k values find the gaps
+    missing = set(range(kmin, kmax, K_STEP)).difference(completed_by_n.get(n, ()))
+    if not missing:
+        return True, []
+
+    return False, [f"{n}_{k}" for k in sorted(missing)] # Keep k order for logging
+
+
+def file_signature(filepath: Path):
+    """Returns (st_mtime_ns, st_size) of filepath, or None if it does not exist."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def load_archive_index(filepath: Path) -> tuple:
+    """
+    Loads the filename metadata cached by a previous run. The index is plain JSON, so a
+    tampered or corrupt file in a shared output directory can only be ignored, never executed.
 
-    return not missing_ids, missing_ids # Return True if missing_ids list is empty
+    Returns:
+        tuple: (signature of COMPLETED_FILE when the index was written, or None,
+                dict: {filename: (mtime_ns, size, n, kmin, kmax, all_complete)})
+    """
+    try:
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        completed_sig = data['completed_sig']
+        if completed_sig is not None:
+            completed_sig = tuple(completed_sig)
+        entries = {name: tuple(values) for name, values in data['entries'].items() if len(values) == 6}
+        return completed_sig, entries
+    except FileNotFoundError:
+        return None, {}
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        print(f"Warning: Ignoring unreadable archive index {filepath}: {e}", file=sys.stderr)
+        return None, {}
+
+def save_archive_index(filepath: Path, completed_sig, entries: dict):
+    """Writes the index atomically: a temp file in the same directory, then os.replace."""
+    # NamedTemporaryFile creates the file 0600; give it the mode a plain open() would
+    umask = os.umask(0)
+    os.umask(umask)
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile('w', dir=filepath.parent, prefix=filepath.name, delete=False) as tmp:
+            tmp_name = tmp.name
+            os.fchmod(tmp.fileno(), 0o666 & ~umask)
+            json.dump({'completed_sig': completed_sig, 'entries': entries}, tmp)
+        os.replace(tmp_name, filepath)
+    except OSError as e:
+        print(f"Warning: Could not write archive index {filepath}: {e}", file=sys.stderr)
+        if tmp_name is not None and os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+def _unlink_with_io_uring(dir_fd: int, names: list[str], failed: dict[str, int], completed: set[str]):
+    """
+    Unlinks names (relative to dir_fd) by queueing one UNLINKAT per name on an
+    io_uring ring and submitting each batch with a single io_uring_enter call.
+
+    Results are recorded as they arrive, so a caller can resume after an exception:
+    every finished name is added to completed, and failures also to failed ({name: errno}).
+    Nothing is submitted if the kernel lacks UNLINKAT (io_uring before Linux 5.11), and
+    EINVAL/EOPNOTSUPP completions are left unfinished; the caller handles those with os.unlink.
+    """
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    liburing.io_uring_queue_init(IO_URING_ENTRIES, ring)
+    try:
+        probe = liburing.io_uring_get_probe_ring(ring)
+        try:
+            unlinkat_supported = liburing.io_uring_opcode_supported(probe, liburing.io_uring_op.IORING_OP_UNLINKAT)
+        finally:
+            liburing.io_uring_free_probe(probe)
+        if not unlinkat_supported:
+            print("  Note: this kernel's io_uring has no UNLINKAT. Using os.unlink.", file=sys.stderr)
+            return
+
+        for start in range(0, len(names), IO_URING_ENTRIES):
+            batch = names[start:start + IO_URING_ENTRIES] # Names must stay alive until the batch completes
+            for index, name in enumerate(batch):
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_unlink(sqe, name, 0, dir_fd) # unlinkat(dir_fd, name, 0)
+                liburing.io_uring_sqe_set_data64(sqe, index)
+            submitted = liburing.io_uring_submit_and_wait(ring, len(batch))
+            for _ in range(submitted):
+                liburing.io_uring_wait_cqe(ring, cqe)
+                entry = cqe[0]
+                name = batch[entry.user_data]
+                try:
+                    entry.res # liburing raises OSError for a negative result
+                except OSError as e:
+                    if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                        failed[name] = e.errno
+                        completed.add(name)
+                    # else: opcode not usable here; leave the name to os.unlink
+                else:
+                    completed.add(name)
+                liburing.io_uring_cqe_seen(ring, entry)
+            if submitted < len(batch):
+                return # The kernel stopped at an SQE it rejected; the rest is left to os.unlink
+    finally:
+        liburing.io_uring_queue_exit(ring)
+
+def remove_files_in_dir(directory: Path, names: list[str]) -> dict[str, int]:
+    """
+    Removes the given file names from directory in one batch: through io_uring when the
+    liburing module is available, otherwise with os.unlink relative to a directory fd.
+    Names io_uring did not finish (it failed partway or cannot unlink here) go through os.unlink.
+
+    Returns:
+        dict: {name: errno} for every name that could not be removed
+    """
+    if not names:
+        return {}
+    failed = {}
+    completed = set()
+    dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        if liburing is not None:
+            try:
+                _unlink_with_io_uring(dir_fd, names, failed, completed)
+            except (OSError, TypeError, AttributeError) as e: # TypeError/AttributeError: binding API mismatch
+                print(f"  Warning: io_uring unlink failed ({e}). Falling back to os.unlink.", file=sys.stderr)
+        for name in names:
+            if name in completed:
+                continue
+            try:
+                os.unlink(name, dir_fd=dir_fd)
+            except OSError as e:
+                failed[name] = e.errno
+        return failed
+    finally:
+        os.close(dir_fd)
 
 
 # --- Main Script ---
@@ -57,52 +238,72 @@ if __name__ == "__main__":
     print(f"Checking completion status against {COMPLETED_FILE}...")
 
     # --- Load Completed IDs ---
-    completed_ids_set = load_completed_ids(COMPLETED_FILE)
-    print(f"Loaded {len(completed_ids_set)} completed IDs.")
+    # Stat before loading, so appends made while loading show up as a change next run
+    completed_sig = file_signature(COMPLETED_FILE)
+    completed_by_n = load_completed_ids(COMPLETED_FILE)
+    print(f"Loaded {sum(map(len, completed_by_n.values()))} completed IDs.")
 
     # --- Find Candidate Files and Check Completion ---
     files_to_archive = []
     files_to_remove_post_archive = [] # Keep track separately for safety
 
-    # Use glob to find potential files
-    for range_file_path in OUTPUT_DIR.glob('uni_*_*_*.txt'):
-        if not range_file_path.is_file(): # Should be redundant with glob but safe check
-            continue
+    # Range files unchanged since the last run (same mtime and size) reuse their parsed
+    # n/kmin/kmax. A cached "complete" result stays valid since IDs are only ever added;
+    # a cached "incomplete" one only while COMPLETED_FILE itself is unchanged.
+    index_completed_sig, cached_entries = load_archive_index(INDEX_PATH)
+    completed_unchanged = completed_sig is not None and completed_sig == index_completed_sig
+    index_entries = {}
+    title_files = [] # Names of .title files, removed at the end
 
-        filename = range_file_path.name
+    # Single scandir pass (range files and .title files): DirEntry caches the file type
+    # from readdir, so only matching range files get a stat(). A missing OUTPUT_DIR scans as empty.
+    output_dir_exists = OUTPUT_DIR.is_dir()
+    with (os.scandir(OUTPUT_DIR) if output_dir_exists else contextlib.nullcontext(())) as it:
+        for entry in it:
+            filename = entry.name
+            if filename.endswith(TITLE_SUFFIX):
+                if entry.is_file(follow_symlinks=False):
+                    title_files.append(filename)
+                continue
+            if not (filename.startswith('uni_') and filename.endswith('.txt')):
+                continue
+            if not entry.is_file(follow_symlinks=False):
+                continue
 
-        # Extract n, kmin, kmax from filename
-        # Format: uni_N_KMIN_KMAX.txt
-        try:
-            # Remove prefix and suffix
-            core_part = filename.removeprefix('uni_').removesuffix('.txt')
-            parts = core_part.split('_')
-            if len(parts) != 3:
-                raise ValueError("Filename does not match N_KMIN_KMAX format")
-
-            n_str, kmin_str, kmax_str = parts
-            n = int(n_str)
-            kmin = int(kmin_str)
-            kmax = int(kmax_str)
-
-        except (ValueError, IndexError) as e:
-            print(f"  Warning: Could not parse n, kmin, kmax from filename '{filename}'. Skipping. Error: {e}")
-            continue
-
-        # Check if all constituent k values are marked as completed
-        all_complete, missing = check_range_completion(n, kmin, kmax, completed_ids_set)
-
-        # Decision: Archive if the file exists AND all its parts are completed
-        if all_complete:
-             # We already know range_file_path exists and is a file from the glob/check
-            num_ids_expected = (kmax - kmin + K_STEP - 1) // K_STEP # Calculate expected IDs
-            print(f"  -> OK: Range file '{filename}' exists and all {num_ids_expected} constituent IDs found in {COMPLETED_FILE.name}. Adding to archive list.")
-            files_to_archive.append(range_file_path)
-        elif not missing and kmin >= kmax: # Empty range case from check_range_completion
-             print(f"  -> Skipping '{filename}': Range [{kmin}, {kmax}) appears empty or invalid.")
-        else:
-            # File might exist or not, but it's incomplete
-            print(f"  -> Skipping '{filename}': Not all constituent IDs are complete. Missing: {' '.join(missing)}")
+            st = entry.stat(follow_symlinks=False)
+            file_key = (st.st_mtime_ns, st.st_size)
+            cached = cached_entries.get(filename)
+            if cached is not None and cached[:2] == file_key:
+                n, kmin, kmax, all_complete = cached[2:]
+            else:
+                cached = None
+                # Extract n, kmin, kmax from filename
+                match = _UNI_RE.match(filename)
+                if match is None:
+                    print(f"  Warning: Could not parse n, kmin, kmax from filename '{filename}'. Skipping.")
+                    continue
+                n, kmin, kmax = map(int, match.groups())
+
+            # Check if all constituent k values are marked as completed
+            if cached is not None and (all_complete or completed_unchanged):
+                missing = None # Result reused from the index
+            else:
+                all_complete, missing = check_range_completion(n, kmin, kmax, completed_by_n)
+            index_entries[filename] = (*file_key, n, kmin, kmax, all_complete)
+
+            # Decision: Archive if the file exists AND all its parts are completed
+            if all_complete:
+                # We already know the entry exists and is a file from the scandir check
+                num_ids_expected = (kmax - kmin + K_STEP - 1) // K_STEP # Calculate expected IDs
+                print(f"  -> OK: Range file '{filename}' exists and all {num_ids_expected} constituent IDs found in {COMPLETED_FILE.name}. Adding to archive list.")
+                files_to_archive.append(Path(entry.path))
+            elif not missing and kmin >= kmax: # Empty range case from check_range_completion
+                 print(f"  -> Skipping '{filename}': Range [{kmin}, {kmax}) appears empty or invalid.")
+            elif missing is None:
+                print(f"  -> Skipping '{filename}': Not all constituent IDs are complete (unchanged since last run).")
+            else:
+                # File might exist or not, but it's incomplete
+                print(f"  -> Skipping '{filename}': Not all constituent IDs are complete. Missing: {' '.join(missing)}")
 
 
     # --- Archiving Process ---
@@ -120,13 +321,26 @@ if __name__ == "__main__":
             print("Creating new archive...")
 
         try:
-            # Use tarfile for safer archiving
-            with tarfile.open(ARCHIVE_PATH, mode=tar_mode) as tar:
+            # Use tarfile for safer archiving. The archive is opened by us with a large buffer,
+            # and copybufsize makes tarfile move member data in large chunks.
+            # A new archive is written in stream mode ('w|'): purely sequential writes in
+            # TAR_STREAM_BUFSIZE blocks. Appending has to seek back over the end-of-archive
+            # marker, so it keeps the random-access 'a' mode on an 'r+b' file.
+            if tar_mode == 'a':
+                file_mode, tarfile_mode = 'r+b', 'a'
+            else:
+                file_mode, tarfile_mode = 'wb', 'w|'
+            with open(ARCHIVE_PATH, file_mode, buffering=ARCHIVE_WRITE_BUFSIZE) as archive_file, \
+                 tarfile.open(fileobj=archive_file, mode=tarfile_mode, bufsize=TAR_STREAM_BUFSIZE,
+                              copybufsize=TAR_COPY_BUFSIZE) as tar:
                 for file_path in files_to_archive:
                     # arcname=file_path.name stores only the filename in the tar
                     # instead of the full path (e.g., stores "uni_....txt" not "out/uni_....txt")
                     print(f"  Adding: {file_path.name}")
-                    tar.add(file_path, arcname=file_path.name)
+                    tarinfo = tar.gettarinfo(file_path, arcname=file_path.name)
+                    # Unbuffered source: reads go straight to the kernel in copybufsize chunks
+                    with open(file_path, 'rb', buffering=0) as src:
+                        tar.addfile(tarinfo, src)
 
             print("Archive operation successful.")
 
@@ -145,45 +359,44 @@ if __name__ == "__main__":
     # --- Remove Archived Files (only if archive succeeded) ---
     if files_to_remove_post_archive:
         print("Removing archived range files...")
-        removed_count = 0
-        failed_removal_count = 0
         for file_path in files_to_remove_post_archive:
-            try:
-                if file_path.exists(): # Check again before removing
-                    print(f"  Removing: {file_path}")
-                    file_path.unlink()
-                    removed_count += 1
-                else:
-                    print(f"  Warning: File already removed or missing: {file_path}")
-            except OSError as e:
-                print(f"  ERROR: Failed to remove {file_path}: {e}", file=sys.stderr)
+            print(f"  Removing: {file_path}")
+        failed = remove_files_in_dir(OUTPUT_DIR, [file_path.name for file_path in files_to_remove_post_archive])
+        failed_removal_count = 0
+        for name, err in failed.items():
+            if err == errno.ENOENT:
+                print(f"  Warning: File already removed or missing: {OUTPUT_DIR / name}")
+            else:
+                print(f"  ERROR: Failed to remove {OUTPUT_DIR / name}: {os.strerror(err)}", file=sys.stderr)
                 failed_removal_count += 1
+        removed_count = len(files_to_remove_post_archive) - len(failed)
+        for file_path in files_to_remove_post_archive:
+            if file_path.name not in failed:
+                index_entries.pop(file_path.name, None)
         print(f"Removal complete. Removed: {removed_count}, Failed: {failed_removal_count}.")
         if failed_removal_count > 0:
              print("Warning: Some files intended for removal could not be deleted.", file=sys.stderr)
 
 
-    # --- Cleanup .title files ---
+    # --- Cleanup .title files (collected during the scandir pass) ---
     print("-------------------------------------")
-    print(f"Removing any remaining '{TITLE_PATTERN}' files in {OUTPUT_DIR}...")
-    title_files_found = list(OUTPUT_DIR.glob(TITLE_PATTERN))
-    if title_files_found:
-        removed_count = 0
-        failed_count = 0
-        for title_file in title_files_found:
-            try:
-                if title_file.is_file(): # Ensure it's a file before unlinking
-                    # print(f"  Removing: {title_file.name}") # Optional verbose logging
-                    title_file.unlink()
-                    removed_count +=1
-            except OSError as e:
-                 print(f"  ERROR: Failed to remove {title_file}: {e}", file=sys.stderr)
-                 failed_count += 1
-        print(f"{removed_count} {TITLE_PATTERN} files removed.")
+    print(f"Removing any remaining '*{TITLE_SUFFIX}' files in {OUTPUT_DIR}...")
+    if title_files:
+        failed = remove_files_in_dir(OUTPUT_DIR, title_files)
+        for name, err in failed.items():
+            if err != errno.ENOENT: # Already gone is fine
+                print(f"  ERROR: Failed to remove {OUTPUT_DIR / name}: {os.strerror(err)}", file=sys.stderr)
+        failed_count = sum(1 for err in failed.values() if err != errno.ENOENT)
+        removed_count = len(title_files) - len(failed)
+        print(f"{removed_count} *{TITLE_SUFFIX} files removed.")
         if failed_count > 0:
-            print(f"Warning: Failed to remove {failed_count} {TITLE_PATTERN} files.", file=sys.stderr)
+            print(f"Warning: Failed to remove {failed_count} *{TITLE_SUFFIX} files.", file=sys.stderr)
     else:
-        print(f"No {TITLE_PATTERN} files found to remove.")
+        print(f"No *{TITLE_SUFFIX} files found to remove.")
+
+    # Only rewrite the index when something changed, to avoid needless churn in the shared output dir
+    if output_dir_exists and (index_entries != cached_entries or completed_sig != index_completed_sig):
+        save_archive_index(INDEX_PATH, completed_sig, index_entries)
 
     print("-------------------------------------")
     print("Archiving script finished.")
@@ -3,9 +3,13 @@
 import os
 import sys
 import math
+import mmap
+import fcntl
+import errno
 import shutil
 import subprocess
 import time
+import re
 from pathlib import Path
 
 # --- Configuration ---
@@ -25,6 +29,9 @@ LOG_DIR = Path("logs")                     # Directory to store PBS log files
 OUTPUT_DIR = Path("out")                   # Directory for output files
 ACCOUNT = "sqct"                           # !!! REPLACE with your project/account string !!!
 WALLTIME_PER_JOB = "4800:00:00"            # Max walltime for EACH job (HH:MM:SS)
+QSUB_MAX_RETRIES = 5                       # Retries when qsub is rejected by scheduler limits
+_QSUB_THROTTLE_RE = re.compile(r'(would exceed .*limit|queue full|too many|maximum number of jobs)', re.IGNORECASE) # Transient qsub rejections only
+_FLOCK_UNSUPPORTED = (errno.ENOSYS, errno.ENOLCK, errno.EOPNOTSUPP) # flock not available on this filesystem
 
 # Tracking files
 TRACKING_FILE_COMPLETED = Path("completed_ids.txt")
@@ -32,80 +39,165 @@ TRACKING_FILE_STARTED = Path("started_ids.txt")
 
 # --- Helper Functions ---
 
-def load_tracked_ids(filepath: Path) -> set:
-    """Loads IDs from a tracking file into a set."""
+def lock_tracking_file(f, operation, filepath: Path):
+    """
+    flock()s an open tracking file. On filesystems without flock support (e.g. Lustre
+    mounted with noflock) this warns and carries on unlocked rather than failing.
+    """
+    try:
+        fcntl.flock(f, operation)
+    except OSError as e:
+        if e.errno not in _FLOCK_UNSUPPORTED:
+            raise
+        print(f"Warning: Cannot lock tracking file {filepath} ({e.strerror}). Continuing without a lock.", file=sys.stderr)
+
+def load_tracked_ids(filepath: Path) -> dict[int, set[int]]:
+    """Loads IDs ("n_k" lines) from a tracking file, indexed by n: {n: {k, ...}}."""
     if not filepath.exists():
-        return set()
+        return {}
     try:
-        with open(filepath, 'r') as f:
-            # Read lines, strip whitespace, filter out empty lines
-            return set(line.strip() for line in f if line.strip())
+        with open(filepath, 'rb') as f:
+            # Shared lock: writers take LOCK_EX, so we never map a half-appended batch
+            lock_tracking_file(f, fcntl.LOCK_SH, filepath)
+            if os.fstat(f.fileno()).st_size == 0: # mmap cannot map an empty file
+                return {}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # split() runs in C and drops whitespace and empty lines
+                id_lines = mm[:].split()
+        ids_by_n = {}
+        for id_bytes in id_lines:
+            n_bytes, _, k_bytes = id_bytes.partition(b'_')
+            try:
+                n, k = int(n_bytes), int(k_bytes)
+            except ValueError:
+                continue # Ignore malformed lines
+            ids_by_n.setdefault(n, set()).add(k)
+        return ids_by_n
     except IOError as e:
         print(f"Error reading tracking file {filepath}: {e}", file=sys.stderr)
         sys.exit(1)
 
 def append_ids_to_file(filepath: Path, ids_to_add: list):
-    """Appends a list of IDs to a file, one ID per line."""
+    """
+    Appends a list of IDs to a file, one ID per line, as a single write followed by fsync.
+    The write happens under an exclusive flock, which readers honour with LOCK_SH.
+    """
+    payload = ''.join(f"{id_str}\n" for id_str in ids_to_add)
     try:
-        with open(filepath, 'a') as f:
-            for id_str in ids_to_add:
-                f.write(f"{id_str}\n")
+        with open(filepath, 'a', buffering=1 << 20) as f:
+            lock_tracking_file(f, fcntl.LOCK_EX, filepath) # Released when the file is closed
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno()) # Make the batch durable so a crash cannot leave a torn tracking file
     except IOError as e:
         print(f"Error writing to tracking file {filepath}: {e}", file=sys.stderr)
         # Don't exit here, as the main script might handle qsub errors
 
-def generate_pbs_script(job_name, config_file_rel, output_file_rel, kmin, kmax_actual, ids_in_range_list):
-    """Generates the content of the PBS submission script."""
-
-    # Generate the lines to write completed IDs within the PBS script
-    completed_id_writing_commands = ""
-    if ids_in_range_list:
-        completed_id_writing_commands = "\n".join([
-            f'    echo "{id_str}" >> "$PBS_O_WORKDIR/{TRACKING_FILE_COMPLETED.name}"'
-            for id_str in ids_in_range_list
-        ])
-        completed_id_writing_commands += f'\n    echo "Successfully marked {len(ids_in_range_list)} IDs as completed."'
+def link_or_copy(src: Path, dst: Path):
+    """
+    Hardlinks src to dst, which costs no data I/O on the same filesystem.
+    Falls back to shutil.copy2 when linking is not possible (e.g. EXDEV across devices).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst) # copy2 preserves metadata like cp -p
+
+def submit_with_backoff(pbs_script: str) -> subprocess.CompletedProcess:
+    """
+    Pipes pbs_script to qsub. If the scheduler rejects it because of a throttling limit,
+    waits 1, 2, 4, ... seconds (at most 60) and retries up to QSUB_MAX_RETRIES times.
+    Any other failure raises immediately.
+    """
+    attempt = 0
+    while True:
+        try:
+            # Capture stdout/stderr to get the job ID or errors from qsub itself
+            return subprocess.run(
+                ['qsub'],
+                input=pbs_script,
+                text=True,
+                check=True, # Raise CalledProcessError if qsub returns non-zero
+                capture_output=True,
+                encoding='utf-8' # Explicitly set encoding
+            )
+        except subprocess.CalledProcessError as e:
+            if attempt >= QSUB_MAX_RETRIES or not _QSUB_THROTTLE_RE.search(e.stderr or ''):
+                raise
+            delay = min(60, 1 << attempt)
+            print(f"qsub was throttled ({e.stderr.strip()}). Retrying in {delay} s...", file=sys.stderr)
+            time.sleep(delay)
+            attempt += 1
+
+def generate_pbs_script(job_name, ranges_file_rel, num_ranges):
+    """
+    Generates the content of the PBS submission script.
+
+    All ranges are submitted as one PBS job array: sub-job i reads line i+1 of
+    ranges_file_rel ("kmin kmax") and processes that k range. A single range is
+    submitted as a plain job, since PBS rejects one-element arrays.
+    """
+    if num_ranges > 1:
+        array_directive = f"#PBS -J 0-{num_ranges - 1}\n"
+        log_stem = f"{job_name}.^array_index^" # PBS substitutes the sub-job index
     else:
-         completed_id_writing_commands = '    echo "No IDs in range to mark as completed."'
-
+        array_directive = ""
+        log_stem = job_name
 
     # Use python f-string formatting. Be careful with shell variables ($) vs python variables ({})
     # Shell variables need to be escaped ($$) if the f-string processor would otherwise interpret them.
-    # Here, $PBS_JOBID, $hostname, $PBS_O_WORKDIR, $EXIT_CODE are shell variables.
+    # Here, $PBS_JOBID, $hostname, $PBS_O_WORKDIR, $EXIT_CODE, $KMIN, $KMAX are shell variables.
     script_content = f"""#!/bin/bash
 #PBS -N {job_name}
-#PBS -l select=1:ncpus=1
+{array_directive}#PBS -l select=1:ncpus=1
 #PBS -l walltime={WALLTIME_PER_JOB}
 #PBS -A {ACCOUNT}
-#PBS -o {LOG_DIR / (job_name + '.out')}
-#PBS -e {LOG_DIR / (job_name + '.err')}
+#PBS -o {LOG_DIR / (log_stem + '.out')}
+#PBS -e {LOG_DIR / (log_stem + '.err')}
 #PBS -j n
 
 echo "PBS Job ID: $PBS_JOBID"
 echo "Running on host: $(hostname)"
 echo "Working directory: $PBS_O_WORKDIR"
-# Use relative paths within the job script as it CWDs
-echo "Processing config file: {config_file_rel}"
-echo "Processing k range: [{kmin}, {kmax_actual}) with step {K_STEP}"
-echo "Expecting output file: {output_file_rel}"
 
 # Important: Change to the submission directory
 cd "$PBS_O_WORKDIR" || {{ echo "Failed to cd to $PBS_O_WORKDIR"; exit 1; }}
 
+# Pick this sub-job's k range from the ranges file
+ARRAY_INDEX=${{PBS_ARRAY_INDEX:-0}}
+read -r KMIN KMAX < <(sed -n "$((ARRAY_INDEX + 1))p" "{ranges_file_rel}")
+if [ -z "$KMIN" ] || [ -z "$KMAX" ]; then
+    echo "No k range found for array index $ARRAY_INDEX in {ranges_file_rel}."
+    exit 1
+fi
+
+# Use relative paths within the job script as it CWDs
+CONFIG_FILE="{CONFIG_DIR.name}/config_{N}_${{KMIN}}_${{KMAX}}.txt"
+OUTPUT_FILE="{OUTPUT_DIR.name}/uni_{N}_${{KMIN}}_${{KMAX}}.txt"
+echo "Processing config file: $CONFIG_FILE"
+echo "Processing k range: [$KMIN, $KMAX) with step {K_STEP}"
+echo "Expecting output file: $OUTPUT_FILE"
+
 export OMP_NUM_THREADS=1
 # Execute using the relative path within PBS_O_WORKDIR
-"./{EXECUTABLE_PATH.name}" -G "{config_file_rel}"
+"./{EXECUTABLE_PATH.name}" -G "$CONFIG_FILE"
 EXIT_CODE=$?
 
 echo "Execution finished with exit code: $EXIT_CODE"
 
 # If successful, mark all k values in the range as completed
 if [ $EXIT_CODE -eq 0 ]; then
-    echo "Job successful. Marking IDs in range [{kmin}, {kmax_actual}) as completed."
-    # Write the IDs one by one
-{completed_id_writing_commands}
+    echo "Job successful. Marking IDs in range [$KMIN, $KMAX) as completed."
+    # Append under an exclusive lock so readers (which take a shared lock) never see a partial batch
+    {{
+        flock -x 9
+        for ((k = KMIN; k < KMAX; k += {K_STEP})); do
+            echo "{N}_$k"
+        done >&9
+    }} 9>> "$PBS_O_WORKDIR/{TRACKING_FILE_COMPLETED.name}"
+    echo "Successfully marked $(( (KMAX - KMIN + {K_STEP} - 1) / {K_STEP} )) IDs as completed."
 else
-    echo "Job failed (Exit Code: $EXIT_CODE). Not marking range [{kmin}, {kmax_actual}) as completed."
+    echo "Job failed (Exit Code: $EXIT_CODE). Not marking range [$KMIN, $KMAX) as completed."
 fi
 
 exit $EXIT_CODE
@@ -127,28 +219,31 @@ if __name__ == "__main__":
         print("Error: NUM_K_PER_JOB must be a positive integer.", file=sys.stderr)
         sys.exit(1)
 
-    # --- Copy BFS layer files ---
-    print("Checking and copying BFS layer files...")
+    # --- Link (or copy) BFS layer files ---
+    print("Checking and linking BFS layer files...")
     for i in range(19):  # 0 to 18
         for ext in ["ind.bin", "uni.bin"]:
             src_file = SOURCE_EXECUTABLE_DIR / f"bfs-layer-{i}.{ext}"
             dst_file = Path(f"./bfs-layer-{i}.{ext}")
             if src_file.is_file() and not dst_file.exists():
-                print(f"Copying {src_file} to {dst_file}")
+                print(f"Linking/copying {src_file} to {dst_file}")
                 try:
-                    shutil.copy2(src_file, dst_file) # copy2 preserves metadata like cp -p
+                    link_or_copy(src_file, dst_file)
                 except Exception as e:
-                    print(f"Error copying {src_file}: {e}", file=sys.stderr)
+                    print(f"Error linking/copying {src_file}: {e}", file=sys.stderr)
                     sys.exit(1)
 
-    # --- Copy executable ---
-    print(f"Copying executable from {SOURCE_EXECUTABLE_PATH} to {EXECUTABLE_PATH}")
+    # --- Link (or copy) executable ---
+    print(f"Linking executable from {SOURCE_EXECUTABLE_PATH} to {EXECUTABLE_PATH}")
     if (not EXECUTABLE_PATH.exists()) and SOURCE_EXECUTABLE_PATH.is_file():
         try:
-            shutil.copy2(SOURCE_EXECUTABLE_PATH, EXECUTABLE_PATH)
-            EXECUTABLE_PATH.chmod(0o755)  # Ensure it's executable (read/write/execute for user, read/execute for group/others)
+            link_or_copy(SOURCE_EXECUTABLE_PATH, EXECUTABLE_PATH)
+            # Ensure it's executable (read/write/execute for user, read/execute for group/others).
+            # A hardlink shares its inode with the source, so only chmod when actually needed.
+            if not os.access(EXECUTABLE_PATH, os.X_OK):
+                EXECUTABLE_PATH.chmod(0o755)
         except Exception as e:
-            print(f"Error copying or setting permissions for executable: {e}", file=sys.stderr)
+            print(f"Error linking/copying or setting permissions for executable: {e}", file=sys.stderr)
             sys.exit(1)
 
     # --- Sanity Checks ---
@@ -162,6 +257,11 @@ if __name__ == "__main__":
         # print("Error: Please replace 'sqct' with your actual PBS account/project string.", file=sys.stderr)
         # sys.exit(1)
 
+    # Fail before any range is selected: a missing qsub must not leave IDs marked as started
+    if shutil.which('qsub') is None:
+        print("Error: qsub command not found. Is PBS installed and in your PATH?", file=sys.stderr)
+        sys.exit(1)
+
     # Create directories if they don't exist
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
     LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -169,8 +269,8 @@ if __name__ == "__main__":
 
     # --- Load existing started IDs ---
     print(f"Loading already started IDs from {TRACKING_FILE_STARTED}...")
-    started_ids_set = load_tracked_ids(TRACKING_FILE_STARTED)
-    print(f"Found {len(started_ids_set)} previously started IDs.")
+    started_by_n = load_tracked_ids(TRACKING_FILE_STARTED)
+    print(f"Found {sum(map(len, started_by_n.values()))} previously started IDs.")
 
     # --- Display Configuration ---
     print("\n--- Configuration ---")
@@ -191,11 +291,20 @@ if __name__ == "__main__":
     skipped_ranges_count = 0
     error_count = 0
     job_k_range_size = NUM_K_PER_JOB * K_STEP  # The span of k values covered by one job
+    ranges_to_submit = [] # (kmin, kmax_actual) per array sub-job
+    ids_to_mark = [] # IDs of all selected ranges, marked as started in one append before qsub
+
+    # Constant fragments for the loop below; plain strings are much cheaper than pathlib here
+    n_prefix = f"{N}_"
+    out_dir_name = OUTPUT_DIR.name
+    cfg_dir_name = CONFIG_DIR.name
+    cfg_dir_str = str(CONFIG_DIR)
+    started_k = started_by_n.setdefault(N, set()) # Started k values for this n
 
     for kmin in range(1, MAX_K, job_k_range_size):
-        # Break if we've submitted enough jobs
-        if submitted_count >= MAX_JOBS:
-            print(f"Reached MAX_JOBS limit ({MAX_JOBS}). Stopping submission.")
+        # Stop once we have enough ranges for MAX_JOBS sub-jobs
+        if len(ranges_to_submit) >= MAX_JOBS:
+            print(f"Reached MAX_JOBS limit ({MAX_JOBS}). Stopping range selection.")
             break
 
         # Calculate the actual end of the range for this job (exclusive)
@@ -203,23 +312,15 @@ if __name__ == "__main__":
         kmax_actual = min(kmax_calc, MAX_K)
 
         # Check if *any* k in the current range [kmin, kmax_actual) has already been started
-        skip_range = False
-        ids_in_range = [] # Store ID strings for this range: ["N_K1", "N_K3", ...]
-        ids_to_check_count = 0 # Keep track of how many IDs we expect in this range
-
-        for current_k in range(kmin, kmax_actual, K_STEP):
-            ids_to_check_count += 1
-            current_id_str = f"{N}_{current_k}"
-            ids_in_range.append(current_id_str) # Store all potential IDs first
-            if current_id_str in started_ids_set:
-                print(f"Skipping range [{kmin}, {kmax_actual}): ID {current_id_str} already found in {TRACKING_FILE_STARTED.name}.")
-                skip_range = True
-                break # No need to check further k in this range
-
-        if skip_range:
+        range_ks = range(kmin, kmax_actual, K_STEP)
+        already_started = started_k.intersection(range_ks)
+        if already_started:
+            print(f"Skipping range [{kmin}, {kmax_actual}): ID {n_prefix}{min(already_started)} already found in {TRACKING_FILE_STARTED.name}.")
             skipped_ranges_count += 1
             continue # Move to the next range
 
+        ids_in_range = [n_prefix + str(k) for k in range_ks] # ["N_K1", "N_K3", ...]
+
         # Check if the range was actually empty (shouldn't happen with kmin=1, step>0)
         if not ids_in_range:
              print(f"Warning: Calculated range [{kmin}, {kmax_actual}) resulted in zero IDs. Skipping.")
@@ -227,21 +328,14 @@ if __name__ == "__main__":
              continue
 
         # If we are here, the range is clear to be submitted.
-        # Mark all IDs in this range as started *before* submitting
-        print(f"Marking range [{kmin}, {kmax_actual}) with {len(ids_in_range)} IDs as started...")
-        append_ids_to_file(TRACKING_FILE_STARTED, ids_in_range)
-        # Also update the in-memory set immediately
-        started_ids_set.update(ids_in_range)
+        # Update the in-memory set immediately; the tracking file is written once before qsub
+        started_k.update(range_ks)
 
-        # --- Prepare for Job Submission ---
+        # --- Prepare the config file for this range ---
         # Use relative paths for files inside the job's working directory
-        output_filename = f"uni_{N}_{kmin}_{kmax_actual}.txt"
-        output_file_rel = OUTPUT_DIR.name / Path(output_filename) # Relative path like "out/uni_..."
-        config_filename = f"config_{N}_{kmin}_{kmax_actual}.txt"
-        config_file_abs = CONFIG_DIR / config_filename
-        config_file_rel = CONFIG_DIR.name / Path(config_filename) # Relative path like "configs/config_..."
-
-        job_name = f"sqct_{N}_{kmin}_{kmax_actual}"
+        range_suffix = f"{N}_{kmin}_{kmax_actual}.txt"
+        output_file_rel = os.path.join(out_dir_name, "uni_" + range_suffix) # Relative path like "out/uni_..."
+        config_file_abs = os.path.join(cfg_dir_str, "config_" + range_suffix)
 
         # Create config file content
         config_content = f"""# Request approximation of R_z rotations by angles of the form $2\\pi k/n$ for k in the interval [k1,k2)
@@ -268,52 +362,60 @@ UNIFORM
         except IOError as e:
             print(f"ERROR: Failed to write config file {config_file_abs}: {e}", file=sys.stderr)
             error_count += 1
-            # Potentially try to remove the IDs added to started_ids (complex due to races)
-            print(f"Warning: IDs for range [{kmin}, {kmax_actual}) were added to {TRACKING_FILE_STARTED.name} but config file creation failed.")
-            continue # Skip submission for this range
+            continue # Leave this range out of the job array (its IDs are not marked)
 
-        # --- Submit Job ---
-        pbs_script = generate_pbs_script(job_name, config_file_rel, output_file_rel, kmin, kmax_actual, ids_in_range)
+        ranges_to_submit.append((kmin, kmax_actual))
+        ids_to_mark.extend(ids_in_range)
 
-        try:
-            # Use subprocess.run to pipe the script content to qsub's stdin
-            # Capture stdout/stderr to get the job ID or errors from qsub itself
-            process = subprocess.run(
-                ['qsub'],
-                input=pbs_script,
-                text=True,
-                check=True, # Raise CalledProcessError if qsub returns non-zero
-                capture_output=True,
-                encoding='utf-8' # Explicitly set encoding
-            )
-            submitted_count += 1
-            job_id = process.stdout.strip()
-            print(f"Submitted job {submitted_count}/{MAX_JOBS} for k range [{kmin}, {kmax_actual}) ({len(ids_in_range)} k values). Job ID: {job_id}")
+    # --- Submit all ranges as one job array ---
+    if ranges_to_submit:
+        first_kmin = ranges_to_submit[0][0]
+        last_kmax = ranges_to_submit[-1][1]
+        job_name = f"sqct_{N}_{first_kmin}_{last_kmax}"
 
-        except FileNotFoundError:
-            print("ERROR: qsub command not found. Is PBS installed and in your PATH?", file=sys.stderr)
-            error_count += 1
-            print(f"Warning: IDs for range [{kmin}, {kmax_actual}) were added to {TRACKING_FILE_STARTED.name} but qsub command failed.")
-            # No more jobs can be submitted if qsub isn't found
-            break
-        except subprocess.CalledProcessError as e:
-            # qsub command executed but returned an error
-            print(f"ERROR: qsub failed for k range [{kmin}, {kmax_actual}) (exit code {e.returncode})", file=sys.stderr)
-            print(f"  qsub stdout: {e.stdout}", file=sys.stderr)
-            print(f"  qsub stderr: {e.stderr}", file=sys.stderr)
-            error_count += 1
-            print(f"Warning: IDs for range [{kmin}, {kmax_actual}) were added to {TRACKING_FILE_STARTED.name} but qsub submission failed.")
-            # Decide whether to continue trying other jobs or stop
-            # continue
-        except Exception as e:
-            # Catch other potential errors during submission
-            print(f"ERROR: An unexpected error occurred during qsub for range [{kmin}, {kmax_actual}): {e}", file=sys.stderr)
+        # Sub-job i reads line i+1 ("kmin kmax"). The name is unique per submission, so
+        # sub-jobs of earlier arrays that are still queued keep reading their own file.
+        ranges_filename = f"ranges_{N}_{first_kmin}_{last_kmax}.txt"
+        ranges_file_abs = os.path.join(cfg_dir_str, ranges_filename)
+        ranges_file_rel = os.path.join(cfg_dir_name, ranges_filename)
+        ranges_content = ''.join(f"{kmin} {kmax_actual}\n" for kmin, kmax_actual in ranges_to_submit)
+
+        pbs_script = None
+        try:
+            with open(ranges_file_abs, 'w') as f:
+                f.write(ranges_content)
+            pbs_script = generate_pbs_script(job_name, ranges_file_rel, len(ranges_to_submit))
+        except IOError as e:
+            print(f"ERROR: Failed to write ranges file {ranges_file_abs}: {e}", file=sys.stderr)
             error_count += 1
-            print(f"Warning: IDs for range [{kmin}, {kmax_actual}) were added to {TRACKING_FILE_STARTED.name} but qsub submission failed.")
-            # continue
 
-        # Be nice to the scheduler
-        time.sleep(0.5)
+        if pbs_script is not None:
+            # Mark all IDs of the job array as started *before* submitting, in a single append
+            print(f"Marking {len(ids_to_mark)} IDs in {len(ranges_to_submit)} range(s) as started...")
+            append_ids_to_file(TRACKING_FILE_STARTED, ids_to_mark)
+            try:
+                # Pipe the script content to qsub's stdin, backing off if the scheduler throttles us
+                process = submit_with_backoff(pbs_script)
+                submitted_count = len(ranges_to_submit)
+                job_id = process.stdout.strip()
+                print(f"Submitted job array with {submitted_count} sub-job(s) for k range [{first_kmin}, {last_kmax}) (ranges in {ranges_file_rel}). Job ID: {job_id}")
+
+            except FileNotFoundError:
+                print("ERROR: qsub command not found. Is PBS installed and in your PATH?", file=sys.stderr)
+                error_count += 1
+                print(f"Warning: IDs for {len(ranges_to_submit)} range(s) were added to {TRACKING_FILE_STARTED.name} but qsub command failed.")
+            except subprocess.CalledProcessError as e:
+                # qsub command executed but returned an error
+                print(f"ERROR: qsub failed for job array {job_name} (exit code {e.returncode})", file=sys.stderr)
+                print(f"  qsub stdout: {e.stdout}", file=sys.stderr)
+                print(f"  qsub stderr: {e.stderr}", file=sys.stderr)
+                error_count += 1
+                print(f"Warning: IDs for {len(ranges_to_submit)} range(s) were added to {TRACKING_FILE_STARTED.name} but qsub submission failed.")
+            except Exception as e:
+                # Catch other potential errors during submission
+                print(f"ERROR: An unexpected error occurred during qsub for job array {job_name}: {e}", file=sys.stderr)
+                error_count += 1
+                print(f"Warning: IDs for {len(ranges_to_submit)} range(s) were added to {TRACKING_FILE_STARTED.name} but qsub submission failed.")
 
     # --- Final Summary ---
     print("\n-------------------------------------")
@@ -1,5 +1,24 @@
 import os
 
+# 配置文件模板（仅替换输出文件名、n、k1、k2、kstep）
+CONFIG_TEMPLATE = """# Request approximation of R_z rotations by angles of the form $2\\pi k/n$ for k in the interval [k1,k2)
+UNIFORM
+#Filename with approximation results
+batch_out/uni%d_%d.txt
+#Minimal number of T gates to use for approximation
+0
+#Maximal number of T gates to use for approximation
+100
+#n
+%d
+#k1
+%d
+#k2
+%d
+#kstep
+%d
+"""
+
 def generate_config_files(m_min, m_max, k_per_batch=1024, k_step=2):
     """
     生成批量配置文件
@@ -18,31 +37,18 @@ def generate_config_files(m_min, m_max, k_per_batch=1024, k_step=2):
         
         total_k_values = (max_k - 1) // k_step + 1
         num_batches = (total_k_values + k_per_batch - 1) // k_per_batch
+        batch_span = k_per_batch * k_step
+        filename_prefix = f"configs/uni{n}_"
         
         for batch in range(num_batches):
-            k1 = 1 + batch * k_per_batch * k_step
-            k2 = min(k1 + k_per_batch * k_step, max_k + 1)
+            k1 = 1 + batch * batch_span
+            k2 = min(k1 + batch_span, max_k + 1)
             
-            config_content = f"""# Request approximation of R_z rotations by angles of the form $2\\pi k/n$ for k in the interval [k1,k2)
-UNIFORM
-#Filename with approximation results
-batch_out/uni{n}_{batch+1}.txt
-#Minimal number of T gates to use for approximation
-0
-#Maximal number of T gates to use for approximation
-100
-#n
-{n}
-#k1
-{k1}
-#k2
-{k2}
-#kstep
-{k_step}
-"""
-            filename = f"configs/uni{n}_{batch+1}.config"
-            with open(filename, 'w') as f:
-                f.write(config_content)
+            payload = (CONFIG_TEMPLATE % (n, batch + 1, n, k1, k2, k_step)).encode()
+            filename = filename_prefix + str(batch + 1) + ".config"
+            # 一次性写入预先生成的字节内容，跳过 stdio 缓冲
+            with open(filename, 'wb', buffering=0) as f:
+                f.write(payload)
             
             print(f"Generated config file: {filename}")
 
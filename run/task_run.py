@@ -1,14 +1,15 @@
 import os
-import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import run
 
 def process_config_file(config_file):
     """处理单个配置文件的函数"""
     output_file = None
     with open(config_file, 'r') as f:
-        for i, line in enumerate(f):
+        for line in f:
             if line.startswith('#Filename with approximation results'):
-                output_file = line[i+1]
+                # 文件名在标题的下一行
+                output_file = next(f, '').strip().lstrip('#').strip()
                 break
     
     if not output_file:
@@ -39,16 +40,16 @@ def batch_run_configs(config_dir='configs', max_workers=10):
     
     print(f"Found {len(config_files)} config files to process")
     
-    # 创建进程池
-    with multiprocessing.Pool(processes=max_workers) as pool:
-        pool.map(process_config_file, config_files)
+    # 每个任务只是等待 ./sqct 子进程结束，用线程池即可，无需额外的 Python 进程
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(process_config_file, config_files))
     
     print("All config files processed")
 
 if __name__ == '__main__':
     # 设置参数
     config_directory = 'configs'  # 配置文件所在目录
-    num_processes = 10           # 并发进程数
+    num_workers = 10             # 并发任务数
     
     # 运行批处理
-    batch_run_configs(config_directory, num_processes)
+    batch_run_configs(config_directory, num_workers)